@@ -35,7 +35,7 @@ def main():
     api = Radikoapi()
     if args.area_id is None:
         # no need to authorize, but need to identify area_id
-        authtoken, area_id = api.authorize()
+        authtoken, area_id = api.authorize_cached()
         if authtoken is None:
             print( "could'nt resolve area-id. use -a.")
             sys.exit(1)
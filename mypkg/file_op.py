@@ -4,10 +4,28 @@
 This module provides a class for performing file operations.
 """
 import os
-import glob
+from concurrent.futures import ThreadPoolExecutor
 
 class Fileop():
     """ A class for performing file operations. """
+    def get_recfiles(self, path, date):
+        """
+        Get the recorded files with the specified date in the given path.
+
+        Args:
+            path (str): The path of the files.
+            date (str): The date string formatted as "%Y-%m-%d".
+
+        Returns:
+            list: The paths of the matching mp4 files.
+        """
+        with os.scandir(path) as entries:
+            return [
+                entry.path
+                for entry in entries
+                if date in entry.name and entry.name.endswith(".mp4")
+            ]
+
     def remove_recfile(self, path, date):
         """
         Remove files with the specified date from the given path.
@@ -20,14 +38,15 @@ class Fileop():
             None
         """
         date = date.strftime("%Y-%m-%d")
-        files = glob.glob(path + "/*" + date + "*.mp4")
-        fl_dic = {}
-        for file in files:
-            size = os.path.getsize(file)
-            fl_dic[file] = size
-        remove = sorted(fl_dic.items(), key=lambda x: x[1], reverse=True)
-        remove.pop(0)
-        for file in remove:
-            # print( 'removing file will be: ' + f[0] )
-            os.remove(file[0])
+        files = self.get_recfiles(path, date)
+        if not files:
+            return
+        # stat in parallel; each stat is a round trip on network mounts
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            sizes = list(zip(executor.map(os.path.getsize, files), files))
+        # keep only the largest (completed) recording
+        _, keep = max(sizes)
+        for _, file in sizes:
+            if file != keep:
+                os.remove(file)
             
\ No newline at end of file
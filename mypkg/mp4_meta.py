@@ -0,0 +1,42 @@
+#!/usr/bin/python3
+# coding: utf-8
+"""
+This module provides a class for setting metadata of recorded MP4 files.
+"""
+from mutagen.mp4 import MP4, MP4Cover
+
+
+class Mp4meta():
+    """ A class for setting metadata tags in recorded MP4 files. """
+    def set_radiko_meta(self, program, channel, area_id, rec_file, coverart):
+        """
+        Set metadata tags of a radiko program in the MP4 file.
+
+        Args:
+            program (Radikoapi): The api object holding the loaded program.
+            channel (str): The ID of the station.
+            area_id (str): The ID of the area.
+            rec_file (str): The path of the recorded file.
+            coverart (bytes): Cover image, already downloaded, or None to
+                leave the cover out.
+
+        Returns:
+            None
+        """
+        meta = program.get_meta(channel, area_id)
+        # album
+        tags = {"\xa9alb": channel}
+        # track title
+        if meta.title is not None:
+            tags["\xa9nam"] = meta.title
+        # artist and album artist
+        if meta.pfm is not None:
+            tags["aART"] = meta.pfm
+            tags["\xa9ART"] = meta.pfm
+        if coverart is not None:
+            tags["covr"] = [MP4Cover(coverart)]
+        audio = MP4(rec_file)
+        if audio.tags is None:
+            audio.add_tags()
+        audio.tags.update(tags)
+        audio.save()
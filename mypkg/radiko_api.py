@@ -10,15 +10,26 @@ import random
 import hashlib
 import json
 import base64
+import os
+import tempfile
+import time as _time
+from collections import namedtuple
 import requests
 
+ProgramMeta = namedtuple("ProgramMeta", ["title", "pfm", "img"])
+
 
 class Radikoapi:
     """
     A class for interacting with the Radiko API.
     """
 
-    def __init__(self):
+    def __init__(self, session=None):
+        """
+        Args:
+            session (requests.Session): Session to send requests with.
+                A new one is created if omitted.
+        """
         self.title = []
         self.url = []
         self.desc = []
@@ -26,29 +37,60 @@ class Radikoapi:
         self.pfm = []
         self.img = []
         self.duration = []
+        # one session so sequential calls reuse the keep-alive connection
+        self.session = session if session is not None else requests.Session()
+        # parsed station lists keyed by area_id, and the areas whose list
+        # was fetched live rather than read from the disk cache
+        self.stationlist = {}
+        self.stationlist_live = set()
+        self.cache_dir = os.path.join(
+            os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+            "rec-radio",
+        )
+        self.token_file = os.path.join(self.cache_dir, "token.json")
+        self.token_ttl = 3600
+        self.stationlist_file = os.path.join(self.cache_dir, "stations-{}.xml")
+        self.stationlist_ttl = 86400
         self.search_url = "https://radiko.jp/v3/api/program/search"
         self.stationlist_url = "https://radiko.jp/v3/station/list/{}.xml"
         self.now_url = "https://radiko.jp/v3/program/now/{}.xml"
         self.weekly_url = "https://radiko.jp/v3/program/station/weekly/{}.xml"
-        # self.today_url = 'http://radiko.jp/v3/program/today/{}.xml'
-        # self.today_url = today_url.format( station_id )
-        # self.tomorrow_url = 'http://radiko.jp/v3/program/tomorrow/{}.xml'
-        # self.tomorrow_url = tomorrow_url.format( station_id )
+        self.timefree_url = (
+            "https://radiko.jp/v2/api/ts/playlist.m3u8"
+            "?station_id={}&l=15&ft={}&to={}"
+        )
 
-    def get_stationlist(self, area_id="JP13"):
+    def get_stationlist(self, area_id="JP13", refresh=False):
         """
         Get the list of stations for the specified area.
+        The parsed list is cached per area for the lifetime of the instance,
+        and the raw XML on disk for stationlist_ttl seconds.
 
         Args:
             area_id (str): The ID of the area. Defaults to "JP13".
+            refresh (bool): Whether to skip both caches and fetch the list live.
+                Defaults to False.
 
         Returns:
             xml.etree.ElementTree.Element: The XML element representing the station list.
         """
+        if area_id in self.stationlist and not refresh:
+            return self.stationlist[area_id]
+        cache_file = self.stationlist_file.format(area_id)
+        try:
+            if not refresh and _time.time() - os.path.getmtime(cache_file) < self.stationlist_ttl:
+                stationlist = ET.parse(cache_file).getroot()
+                self.stationlist[area_id] = stationlist
+                return stationlist
+        except (OSError, ET.ParseError):
+            pass
         stationlist_url = self.stationlist_url.format(area_id)
-        resp = requests.get(stationlist_url, timeout=(20, 5))
+        resp = self.session.get(stationlist_url, timeout=(20, 5))
         if resp.status_code == 200:
             stationlist = ET.fromstring(resp.content.decode("utf-8"))
+            self.stationlist[area_id] = stationlist
+            self.stationlist_live.add(area_id)
+            self._write_cache(cache_file, resp.content)
             return stationlist
         else:
             print(resp.status_code)
@@ -57,6 +99,7 @@ class Radikoapi:
     def is_avail(self, station, area_id="JP13"):
         """
         Check if the specified station is available in the given area.
+        A station missing from a disk-cached list is checked again live.
 
         Args:
             station (str): The ID of the station.
@@ -69,7 +112,12 @@ class Radikoapi:
         for stationid in stationlist.iter("id"):
             if stationid.text == station:
                 return True
-        return False
+        if area_id in self.stationlist_live:
+            return False
+        # the disk-cached list may be out of date; check once more live
+        if self.get_stationlist(area_id, refresh=True) is None:
+            return False
+        return self.is_avail(station, area_id)
 
     def get_channel(self, area_id="JP13"):
         """
@@ -131,7 +179,7 @@ class Radikoapi:
             True if found
         """
         now_url = self.now_url.format(area_id)
-        resp = requests.get(now_url, timeout=(20, 5))
+        resp = self.session.get(now_url, timeout=(20, 5))
         if resp.status_code == 200:
             now = ET.fromstring(resp.content.decode("utf-8"))
             xpath = f'.//station[@id="{station}"]//progs/prog[@ft="{fromtime}"]'
@@ -159,7 +207,7 @@ class Radikoapi:
             True if found
         """
         weekly_url = self.weekly_url.format(station)
-        resp = requests.get(weekly_url, timeout=(20, 5))
+        resp = self.session.get(weekly_url, timeout=(20, 5))
         if resp.status_code == 200:
             weekly = ET.fromstring(resp.content.decode("utf-8"))
             if totime is None:
@@ -315,6 +363,50 @@ class Radikoapi:
             self.load_now(station, area_id)
         return self.img[index]
 
+    def get_cover(self, station, area_id, next_prog=False):
+        """
+        Download the image of the current or next program for the specified station.
+
+        Args:
+            station (str): The ID of the station.
+            area_id (str): The ID of the area.
+            next_prog (bool): Whether to get the next program. Defaults to False.
+
+        Returns:
+            bytes: The image, or None if there is none or the download fails.
+        """
+        try:
+            img_url = self.get_img(station, area_id, next_prog)
+            resp = self.session.get(img_url, timeout=(20, 5))
+        except (IndexError, ET.ParseError, requests.RequestException):
+            return None
+        if resp.status_code == 200:
+            return resp.content
+        else:
+            print(resp.status_code)
+            return None
+
+    def get_meta(self, station, area_id, next_prog=False):
+        """
+        Get the title, performer and image URL of the current or next program
+        for the specified station in one call.
+
+        Args:
+            station (str): The ID of the station.
+            area_id (str): The ID of the area.
+            next_prog (bool): Whether to get the next program. Defaults to False.
+
+        Returns:
+            ProgramMeta: A namedtuple of title, pfm and img.
+        """
+        if next_prog is True:
+            index = 1
+        else:
+            index = 0
+        if not self.title:
+            self.load_now(station, None, area_id)
+        return ProgramMeta(self.title[index], self.pfm[index], self.img[index])
+
     def generate_uid(self):
         """
         Generate a unique ID for the API request.
@@ -353,9 +445,7 @@ class Radikoapi:
             "app_id": "pc",
             "action_id": "0",
         }
-        response = requests.get(
-            "http://radiko.jp/v3/api/program/search", params=params, timeout=(20, 5)
-        )
+        response = self.session.get(self.search_url, params=params, timeout=(20, 5))
         return json.loads(response.content)
 
     def authorize(self):
@@ -374,7 +464,7 @@ class Radikoapi:
             "x-radiko-user": "dummy_user",
         }
         url = "https://radiko.jp/v2/api/auth1"
-        res = requests.get(url, headers=headers, timeout=(20, 5))
+        res = self.session.get(url, headers=headers, timeout=(20, 5))
         if res.status_code == 200:
             token = res.headers["x-radiko-authtoken"]
             offset = int(res.headers["x-radiko-keyoffset"])
@@ -389,7 +479,7 @@ class Radikoapi:
                 "x-radiko-user": "dummy_user",
             }
             url = "https://radiko.jp/v2/api/auth2"
-            res = requests.get(url, headers=headers, timeout=(20, 5))
+            res = self.session.get(url, headers=headers, timeout=(20, 5))
             if res.status_code == 200:
                 return token, res.text.split(",")[0]
             else:
@@ -399,6 +489,69 @@ class Radikoapi:
             print(f"authorize errr at phase#1 : {res.status_code}")
             return None
 
+    def authorize_cached(self, min_valid=0, refresh=False):
+        """
+        Same as authorize(), but reuses the token cached on disk while it is
+        still valid, skipping the auth1/auth2 round trips.
+
+        Args:
+            min_valid (int): Seconds the token must stay valid for, e.g. the
+                length of a live recording. Defaults to 0.
+            refresh (bool): Whether to authorize again and replace the cached
+                token, e.g. when radiko has rejected it. Defaults to False.
+
+        Returns:
+            tuple: A tuple containing the authentication token and area ID.
+                If authentication fails, None is returned.
+        """
+        try:
+            with open(self.token_file, encoding="utf-8") as file:
+                cached = json.load(file)
+            if not refresh and _time.time() + min_valid < cached["expires_at"] - 60:
+                return cached["token"], cached["area_id"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        auth = self.authorize()
+        if auth is not None:
+            token, area_id = auth
+            self._write_cache(
+                self.token_file,
+                json.dumps(
+                    {
+                        "token": token,
+                        "area_id": area_id,
+                        "expires_at": _time.time() + self.token_ttl,
+                    }
+                ).encode("utf-8"),
+            )
+        return auth
+
+    def _write_cache(self, path, data):
+        """
+        Write a cache file atomically; concurrent runs may refresh it at the
+        same time. The cache is best-effort, so a failed write is ignored.
+
+        Args:
+            path (str): The path of the cache file.
+            data (bytes): The content to write.
+
+        Returns:
+            None
+        """
+        tmp = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.cache_dir)
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            if tmp is not None:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+
     def dump(self):
         """ dump class member var. for debug """
         print("Title: ", *self.title, sep="\n")
@@ -422,7 +575,6 @@ if __name__ == "__main__":
         print(f"{i} station : {station_id}\t\tname : {names[i]}")
     print("--------------------")
 
-    # result = api.search('黒田 卓也')
     result = api.search("生島ヒロシ")
     for d in result["data"]:
         print(
@@ -431,12 +583,9 @@ if __name__ == "__main__":
             re.sub("[-: ]", "", d["start_time"]),
             re.sub("[-: ]", "", d["end_time"]),
         )
-    # print( json.dumps( result, indent=4 ) )
 
     api.load_program("TBS", "20230529050000", "20230529063000")
     api.dump()
 
-    fromt = DT.now().strftime("%Y%m%d%H%M00")
-    # api.load_program("TBS", fromt, None, now=True)
     api.load_program("TBS", "20230605190000", None, now=True)
     api.dump()
@@ -10,15 +10,19 @@ Date: May 25, 2023
 """
 import argparse
 import sys
+import os
 import shutil
 import subprocess
 import json
 import xml.etree.ElementTree as ET
 from datetime import datetime as DT
+from concurrent.futures import ThreadPoolExecutor
 import requests
 from mutagen.mp4 import MP4, MP4Cover
 from mypkg.file_op import Fileop
 
+FFMPEG = shutil.which("ffmpeg")
+
 
 def get_args():
     """
@@ -108,28 +112,32 @@ def live_rec(dl_url, duration, outdir, prefix, date):
     """
     Perform live recording.
     """
-    ffmpeg = shutil.which("ffmpeg")
-    if ffmpeg is None:
+    if FFMPEG is None:
         print("This tool need ffmpeg to be installed to executable path")
         print("Soryy, bye.")
         sys.exit(1)
-    cmd = f"{ffmpeg} -loglevel fatal -y "
-    cmd += f"-i {dl_url} -t {duration} "
-    cmd += f"{outdir}/{prefix}_{date}.mp4"
+    out_path = os.path.join(outdir, f"{prefix}_{date}.mp4")
+    cmd = [
+        FFMPEG, "-loglevel", "fatal", "-y",
+        "-i", dl_url, "-t", str(duration),
+        out_path,
+    ]
     proc = subprocess.run(
-        cmd, check=True, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        cmd, check=False, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
     )
     if proc.returncode != 0:
-        print(f"ffmpeg abnormal end. {proc.returncode}, {proc.stdout}, {proc.stderr}")
+        print(f"ffmpeg abnormal end. {proc.returncode}, {proc.stderr.decode(errors='replace')}")
         sys.exit(1)
     else:
-        return f"{outdir}/{prefix}_{date}.mp4"
+        return out_path
 
 
 def get_largest_logourl(program):
     """
-    Get the URL for the largest logo image associated with the program.
+    Get the URL for the largest logo image associated with the program,
+    or None if the program has no logo.
     """
+    logo_url = None
     logo = program[0]["program_logo"]
     if logo is None:
         logo = program[0]["service"]["logo_l"]
@@ -142,7 +150,20 @@ def get_largest_logourl(program):
     return logo_url
 
 
-def set_mp4_meta(program, channel, rec_file):
+def get_coverart(program):
+    """
+    Download the largest logo image of the program, or None if there is none.
+    """
+    logo_url = get_largest_logourl(program)
+    if logo_url is None:
+        return None
+    try:
+        return requests.get(logo_url, timeout=(20, 5)).content
+    except requests.RequestException:
+        return None
+
+
+def set_mp4_meta(program, channel, rec_file, coverart):
     """
     Set metadata tags in the MP4 file.
     """
@@ -155,14 +176,12 @@ def set_mp4_meta(program, channel, rec_file):
     audio.tags["\xa9alb"] = nhk_album.get(channel, None)
     # artist and album artist
     if program[0]["act"] is not None:
-        audio.tags["\aART"] = program[0]["act"]
+        audio.tags["aART"] = program[0]["act"]
         audio.tags["\xa9ART"] = program[0]["act"]
-    logo_url = get_largest_logourl(program)
-    coverart = requests.get(logo_url, timeout=(20, 5)).content
-    cover = MP4Cover(coverart)
-    audio["covr"] = [cover]
+    if coverart is not None:
+        cover = MP4Cover(coverart)
+        audio["covr"] = [cover]
     audio.save()
-    # print( audio.tags.pprint() )
 
 
 def main():
@@ -188,10 +207,15 @@ def main():
     dl_url, code = get_streamurl(channel, here)
     # get program information
     program = get_program_info(area_code, code, timing)
-    # Recording...
-    rec_file = live_rec(dl_url, duration, outdir, prefix, date)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        # look up and download cover art while ffmpeg is recording;
+        # a missing logo never stops the recording
+        cover_future = executor.submit(get_coverart, program)
+        # Recording...
+        rec_file = live_rec(dl_url, duration, outdir, prefix, date)
+        coverart = cover_future.result()
     # Set meta information to MP4 tag
-    set_mp4_meta(program, channel, rec_file)
+    set_mp4_meta(program, channel, rec_file, coverart)
     fop = Fileop()
     if args.cleanup:
         fop.remove_recfile(outdir, DT.today())
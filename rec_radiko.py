@@ -10,15 +10,21 @@ Date: May 25, 2023
 """
 import argparse
 import sys
+import os
 import shutil
 import subprocess
 import time
+import threading
+import collections
 from datetime import datetime as DT
+from concurrent.futures import ThreadPoolExecutor
 import re
 import requests
-from mutagen.mp4 import MP4, MP4Cover
 from mypkg.radiko_api import Radikoapi
 from mypkg.file_op import Fileop
+from mypkg.mp4_meta import Mp4meta
+
+FFMPEG = shutil.which("ffmpeg")
 
 
 def get_args():
@@ -60,6 +66,9 @@ def get_streamurl(channel, authtoken):
     }
     res = requests.get(url, headers=headers, timeout=(20, 5))
     res.encoding = "utf-8"
+    if res.status_code in (401, 403):
+        # token rejected; let the caller authorize again
+        return None
     if res.status_code == 200:
         body = res.text
         lines = re.findall("^https?://.+m3u8$", body, flags=re.MULTILINE)
@@ -73,53 +82,53 @@ def get_streamurl(channel, authtoken):
         sys.exit(1)
 
 
+def drain(pipe, tail):
+    """
+    Keep reading a pipe so the child never blocks on it, holding the tail.
+    """
+    for line in pipe:
+        tail.append(line)
+
+
 def live_rec(url_parts, auth_token, prefix, duration, date, outdir):
     """
     Perform live recording.
     """
-    ffmpeg = shutil.which("ffmpeg")
-    if ffmpeg is None:
+    if FFMPEG is None:
         print("This tool need ffmpeg to be installed to executable path")
         print("Soryy, bye.")
         sys.exit(1)
-    cmd = f"{ffmpeg} -loglevel fatal "
-    cmd += f'-headers "X-Radiko-AuthToken: {auth_token}" -i "{url_parts}" '
-    cmd += f"-acodec copy {outdir}/{prefix}_{date}.mp4"
+    out_path = os.path.join(outdir, f"{prefix}_{date}.mp4")
+    cmd = [
+        FFMPEG, "-loglevel", "fatal",
+        "-headers", f"X-Radiko-AuthToken: {auth_token}",
+        "-i", url_parts,
+        "-acodec", "copy", out_path,
+    ]
 
     # Exec ffmpeg
     proc = subprocess.Popen(
-        cmd, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    # drain stderr during the recording; keep only the last lines
+    err_tail = collections.deque(maxlen=64)
+    drainer = threading.Thread(
+        target=drain, args=(proc.stderr, err_tail), daemon=True)
+    drainer.start()
     time.sleep(duration)
-    proc.communicate(b"q")
+    try:
+        proc.stdin.write(b"q")
+        proc.stdin.close()
+    except BrokenPipeError:
+        # ffmpeg has already exited
+        pass
+    proc.wait()
+    drainer.join()
     if proc.returncode != 0:
-        print(
-            f"ffmpeg abnormal end. {proc.returncode}, {proc.stdout}, {proc.stderr}")
+        err = b"".join(err_tail).decode(errors="replace")
+        print(f"ffmpeg abnormal end. {proc.returncode}, {err}")
         sys.exit(1)
     else:
-        return f"{outdir}/{prefix}_{date}.mp4"
-
-
-def set_mp4_meta(program, channel, area_id, rec_file):
-    """
-    Set metadata tags in the MP4 file.
-    """
-    audio = MP4(rec_file)
-    # track title
-    title = program.get_title(channel, area_id)
-    if title is not None:
-        audio.tags["\xa9nam"] = title
-    # album
-    audio.tags["\xa9alb"] = channel
-    # artist and album artist
-    pfm = program.get_pfm(channel, area_id)
-    if pfm is not None:
-        audio.tags["\aART"] = pfm
-        audio.tags["\xa9ART"] = pfm
-    logo_url = program.get_img(channel, area_id)
-    coverart = requests.get(logo_url, timeout=(20, 5)).content
-    cover = MP4Cover(coverart)
-    audio["covr"] = [cover]
-    audio.save()
+        return out_path
 
 
 def main():
@@ -143,13 +152,26 @@ def main():
     if api.is_avail(channel) is False:
         print(f"Specified station {channel} is not found.")
         sys.exit(1)
-    # auhorize, get token and areaid
-    auth_token, area_id = api.authorize()
+    # auhorize, get token and areaid; ffmpeg keeps using the token
+    # for the whole recording
+    auth_token, area_id = api.authorize_cached(min_valid=duration)
     # get program meta via radiko api
     url = get_streamurl(channel, auth_token)
+    if url is None:
+        # cached token is no longer accepted; authorize once more
+        auth_token, area_id = api.authorize_cached(min_valid=duration, refresh=True)
+        url = get_streamurl(channel, auth_token)
+        if url is None:
+            print("Radiko: authorization rejected.")
+            sys.exit(1)
     api.load_program(channel, fromtime, None, area_id, now=True)
-    rec_file = live_rec(url, auth_token, prefix, duration, date, outdir)
-    set_mp4_meta(api, channel, area_id, rec_file)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        # look up and download cover art while ffmpeg is recording;
+        # a missing cover never stops the recording
+        cover_future = executor.submit(api.get_cover, channel, area_id)
+        rec_file = live_rec(url, auth_token, prefix, duration, date, outdir)
+        coverart = cover_future.result()
+    Mp4meta().set_radiko_meta(api, channel, area_id, rec_file, coverart)
     fop = Fileop()
     if args.cleanup:
         fop.remove_recfile(outdir, DT.today())
@@ -9,19 +9,25 @@ Author: Hiroyuki NAKAMURA (https://github.com/hry-naka)
 Date: May 30, 2023
 """
 import sys
+import os
 import argparse
 import shutil
 import subprocess
 from datetime import datetime as DT
-import requests
-from mutagen.mp4 import MP4, MP4Cover
+from concurrent.futures import ThreadPoolExecutor
 from mypkg.radiko_api import Radikoapi
 from mypkg.file_op import Fileop
+from mypkg.mp4_meta import Mp4meta
 
+FFMPEG = shutil.which("ffmpeg")
 
-def get_args():
+
+def get_args(argv=None):
     """
     Get command-line arguments.
+
+    Args:
+        argv (list): Arguments to parse. Defaults to sys.argv[1:].
     """
     parser = argparse.ArgumentParser(description="Recording time-free-Radiko.")
     parser.add_argument(
@@ -45,61 +51,57 @@ def get_args():
         action="store_true",
         help="Cleanup(remove) output file which recording is not completed.",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--no-auth-cache",
+        action="store_true",
+        help="Authorize again instead of reusing the cached token.",
+    )
+    parser.add_argument(
+        "--refresh-stations",
+        action="store_true",
+        help="Download the station list again instead of using the cached one.",
+    )
+    return parser.parse_args(argv)
 
 
-def tf_rec(token, channel, fromtime, totime, pre_fix, time, out_dir):
+def tf_rec(token, url, pre_fix, time, out_dir):
     """
     Perform time-free recording.
+    Returns the path of the recorded file, or None if ffmpeg failed.
     """
-    ffmpeg = shutil.which("ffmpeg")
-    if ffmpeg is None:
+    if FFMPEG is None:
         print("This tool need ffmpeg to be installed to executable path")
         print("Soryy, bye.")
         sys.exit(1)
-    url = "https://radiko.jp/v2/api/ts/playlist.m3u8?station_id={}&l=15&ft={}&to={}"
-    url = url.format(channel, fromtime, totime)
-    cmd = f"{ffmpeg} -loglevel fatal "
-    cmd += f'-headers "X-Radiko-AuthToken: {token}" -i "{url}" '
-    cmd += f"-acodec copy {out_dir}/{pre_fix}_{time}.mp4"
+    out_path = os.path.join(out_dir, f"{pre_fix}_{time}.mp4")
+    cmd = [
+        FFMPEG, "-nostdin", "-y", "-loglevel", "fatal",
+        "-fflags", "+genpts",
+        "-headers", f"X-Radiko-AuthToken: {token}",
+        "-http_persistent", "1", "-http_multiple", "1",
+        "-reconnect", "1", "-reconnect_streamed", "1", "-reconnect_delay_max", "5",
+        "-i", url,
+        "-acodec", "copy", "-avoid_negative_ts", "make_zero",
+        out_path,
+    ]
     # Exec ffmpeg...
     proc = subprocess.run(
-        cmd, check=True, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        cmd, check=False, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
     )
     if proc.returncode != 0:
-        print(f"ffmpeg abnormal end. {proc.returncode}, {proc.stdout}, {proc.stderr}")
-        sys.exit(1)
-    return f"{out_dir}/{pre_fix}_{time}.mp4"
+        print(f"ffmpeg abnormal end. {proc.returncode}, {proc.stderr.decode(errors='replace')}")
+        return None
+    return out_path
 
 
-def set_mp4_meta(program, channel, area_id, rec_file):
-    """
-    Set metadata tags in the MP4 file.
-    """
-    audio = MP4(rec_file)
-    # track title
-    title = program.get_title(channel, area_id)
-    if title is not None:
-        audio.tags["\xa9nam"] = title
-    # album
-    audio.tags["\xa9alb"] = channel
-    # artist and album artist
-    pfm = program.get_pfm(channel, area_id)
-    if pfm is not None:
-        audio.tags["\aART"] = pfm
-        audio.tags["\xa9ART"] = pfm
-    logo_url = program.get_img(channel, area_id)
-    coverart = requests.get(logo_url, timeout=(20, 5)).content
-    cover = MP4Cover(coverart)
-    audio["covr"] = [cover]
-    audio.save()
-
-
-def main():
+def main(argv=None):
     """
     Main function for the script.
+
+    Args:
+        argv (list): Command-line arguments. Defaults to sys.argv[1:].
     """
-    args = get_args()
+    args = get_args(argv)
     station = args.station[0]
     if args.prefix is None:
         prefix = station
@@ -107,20 +109,52 @@ def main():
         prefix = args.prefix
     fromtime = args.fromtime[0]
     totime = args.totime[0]
+    # validate time range once, and reuse the parsed start time
+    # strptime accepts one-digit fields, so check the exact 14 digits first
+    try:
+        if not all(len(t) == 14 and t.isdigit() for t in (fromtime, totime)):
+            raise ValueError
+        from_dt = DT.strptime(fromtime, "%Y%m%d%H%M%S")
+        to_dt = DT.strptime(totime, "%Y%m%d%H%M%S")
+    except ValueError:
+        print("fromtime and totime must be in the form of YYYYMMDDHHMMSS.")
+        sys.exit(1)
+    if to_dt <= from_dt:
+        print("totime must be later than fromtime.")
+        sys.exit(1)
     # setting date
-    now = f"{fromtime[0:4]}-{fromtime[4:6]}-{fromtime[6:8]}-{fromtime[8:10]}_{fromtime[10:12]}"
+    now = from_dt.strftime("%Y-%m-%d-%H_%M")
     # Construct RadikoApi
     api = Radikoapi()
+    if args.refresh_stations:
+        api.stationlist_ttl = 0
     # Check whether channel is available
     if api.is_avail(station) is False:
         print(f"Specified station {station} is not found.")
         sys.exit(1)
-    # auhorize, get token and areaid
-    auth_token, areaid = api.authorize()
+    # auhorize, get token and areaid; ffmpeg keeps using the token
+    # for the whole download
+    min_valid = int((to_dt - from_dt).total_seconds())
+    # --no-auth-cache authorizes again, and the fresh token replaces the cached one
+    auth_token, areaid = api.authorize_cached(
+        min_valid=min_valid, refresh=args.no_auth_cache
+    )
     # get program meta via radiko api
     api.load_program(station, fromtime, totime, areaid)
-    recfile = tf_rec(auth_token, station, fromtime, totime, prefix, now, args.outputdir)
-    set_mp4_meta(api, station, areaid, recfile)
+    url = api.timefree_url.format(station, fromtime, totime)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        # look up and download cover art while ffmpeg is recording;
+        # a missing cover never stops the recording
+        cover_future = executor.submit(api.get_cover, station, areaid)
+        recfile = tf_rec(auth_token, url, prefix, now, args.outputdir)
+        coverart = cover_future.result()
+    if recfile is None:
+        # the cached token may have been rejected; authorize once more
+        auth_token, areaid = api.authorize_cached(min_valid=min_valid, refresh=True)
+        recfile = tf_rec(auth_token, url, prefix, now, args.outputdir)
+        if recfile is None:
+            sys.exit(1)
+    Mp4meta().set_radiko_meta(api, station, areaid, recfile, coverart)
     fop = Fileop()
     if args.cleanup:
         fop.remove_recfile(args.outputdir, DT.today())